@@ -1,15 +1,18 @@
-from fastapi import FastAPI, File, Form, UploadFile, HTTPException
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
-import json, uuid, hashlib, time, os
+from typing import List, Literal, Optional
+import json, uuid, hashlib, time, os, csv, zlib
+from itertools import islice
+import ijson
+from fontTools import subset
+from fontTools.ttLib import TTFont
 from web3 import Web3
 import speech_recognition as sr
 from pydub import AudioSegment
 from langdetect import detect
 from transformers import pipeline
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
 import io
 
 app = FastAPI(title="Campus Issue Resolver API")
@@ -65,6 +68,13 @@ class InventoryItem(BaseModel):
     name: str
     qty: int
 
+def save_json(path, obj):
+    # write to a temp file and swap it in, so readers holding the old file keep a complete copy
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
 # --- Endpoints ---
 
 @app.post("/api/issues", response_model=Issue)
@@ -95,8 +105,7 @@ def raise_issue(payload: dict):
     except:
         issues = []
     issues.append(issue)
-    with open("data/issues.json", "w") as f:
-        json.dump(issues, f)
+    save_json("data/issues.json", issues)
     return issue
 
 @app.get("/api/issues/vendor", response_model=List[Issue])
@@ -118,8 +127,7 @@ def accept_issue(issue_id: str):
         if i["id"] == issue_id:
             i["status"] = "accepted"
             break
-    with open("data/issues.json", "w") as f:
-        json.dump(issues, f)
+    save_json("data/issues.json", issues)
     return {"ok": True}
 
 @app.get("/api/inventory", response_model=List[InventoryItem])
@@ -163,14 +171,311 @@ async def voice_report(audio: UploadFile = File(...), issue_id: str = Form(...))
         reports = []
     report_entry = {"issue_id": issue_id, "text": text, "lang": lang, "summary": summary, "timestamp": int(time.time())}
     reports.append(report_entry)
-    with open("data/reports.json", "w") as f:
-        json.dump(reports, f)
+    save_json("data/reports.json", reports)
     return {"report": summary}
 
 @app.get("/api/chain")
 def get_chain():
     return CHAIN
 
+# --- Audit export ---
+EXPORT_COLUMNS = ["issue_id", "title", "reporter", "severity", "status", "tx_hash", "block_index",
+                  "report_lang", "report_summary", "report_timestamp"]
+# rows per chunk, and issues read per pass. reports.json is rescanned once per chunk of issues to
+# keep memory bounded, so an export reads it about len(issues) / EXPORT_CHUNK_ROWS times: fine for
+# a semester of reports, raise the chunk size (more memory, fewer passes) if it ever dominates.
+EXPORT_CHUNK_ROWS = 500
+
+def _open_store(path):
+    # a missing file is an empty store
+    try:
+        return open(path, "rb")
+    except FileNotFoundError:
+        return None
+
+def _iter_json_items(f):
+    # streams the top-level array of an open data file item by item
+    if f is None:
+        return
+    f.seek(0)
+    yield from ijson.items(f, "item")
+
+def iter_export_rows(chunk_size=EXPORT_CHUNK_ROWS):
+    # yields lists of at most chunk_size rows: issues joined with their reports and chain blocks.
+    # both files are opened once up front; writers replace them atomically (save_json), so these
+    # handles stay on one consistent snapshot for the whole export.
+    block_index = {b["hash"]: b["index"] for b in CHAIN}
+    issues_file = _open_store("data/issues.json")
+    reports_file = _open_store("data/reports.json")
+    try:
+        issues_iter = _iter_json_items(issues_file)
+        chunk = []
+        while True:
+            issues = list(islice(issues_iter, chunk_size))
+            if not issues:
+                break
+            ids = {i.get("id") for i in issues}
+            reports_by_issue = {}
+            for r in _iter_json_items(reports_file):
+                if r.get("issue_id") in ids:
+                    reports_by_issue.setdefault(r.get("issue_id"), []).append(r)
+            for i in issues:
+                base = [i.get("id", ""), i.get("title", ""), i.get("reporter", ""), i.get("severity", ""),
+                        i.get("status", ""), i.get("txHash", ""), block_index.get(i.get("txHash"), "")]
+                for r in reports_by_issue.get(i.get("id")) or [{}]:
+                    chunk.append(base + [r.get("lang", ""), r.get("summary", ""), r.get("timestamp", "")])
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        for f in (issues_file, reports_file):
+            if f is not None:
+                f.close()
+
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+def _csv_safe(value):
+    # spreadsheets evaluate cells starting with these characters as formulas
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def stream_csv():
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in iter_export_rows():
+        writer.writerows([_csv_safe(v) for v in row] for row in rows)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+# TrueType font embedded for free-text PDF cells; override with EXPORT_PDF_FONT for scripts the
+# defaults do not cover (e.g. a Noto Sans Devanagari/Tamil/CJK .ttf)
+EXPORT_PDF_FONT = os.environ.get("EXPORT_PDF_FONT") or next(
+    (p for p in ["/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+                 "/usr/share/fonts/TTF/DejaVuSans.ttf",
+                 "/usr/share/fonts/truetype/freefont/FreeSans.ttf",
+                 "/Library/Fonts/Arial Unicode.ttf",
+                 "C:/Windows/Fonts/arialuni.ttf"] if os.path.exists(p)), None)
+# drawn instead of text the PDF cannot render; the CSV export always has the full value
+PDF_UNRENDERABLE = "[see CSV]"
+
+class PdfUnicodeFont:
+    # TrueType font embedded as a Type0/CIDFontType2 font with Identity-H encoding: text is written
+    # as glyph ids and a ToUnicode CMap maps them back for search and copy. Glyphs are not shaped,
+    # so scripts that need GSUB (e.g. Devanagari conjuncts) show their base forms.
+    def __init__(self, path):
+        self.path = path
+        self.font = TTFont(path, fontNumber=0)
+        if "glyf" not in self.font:
+            raise ValueError(f"{path}: only TrueType outlines can be embedded")
+        self.cmap = self.font.getBestCmap()
+        self.scale = 1000 / self.font["head"].unitsPerEm
+        self.used = {}
+
+    def covers(self, text):
+        return all(ord(c) in self.cmap for c in text)
+
+    def _advance(self, c):
+        return round(self.font["hmtx"][self.cmap[ord(c)]][0] * self.scale)
+
+    def width(self, text, size):
+        return sum(self._advance(c) for c in text) * size / 1000
+
+    def encode(self, text):
+        gids = []
+        for c in text:
+            gid = self.font.getGlyphID(self.cmap[ord(c)])
+            self.used.setdefault(gid, c)
+            gids.append(f"{gid:04X}")
+        return "<" + "".join(gids) + ">"
+
+    def objects(self, type0_id, first_id):
+        # (object number, body) pairs for the font, built once all pages are written
+        cid_id, desc_id, file_id, cmap_id = range(first_id, first_id + 4)
+        name = "AUDITF+" + "".join(c for c in (self.font["name"].getDebugName(6) or "Font") if c.isalnum() or c == "-")
+        head, hhea, os2 = self.font["head"], self.font["hhea"], self.font["OS/2"]
+        sc = lambda v: round(v * self.scale)
+        gids = sorted(self.used)
+        widths = " ".join(f"{g} [{self._advance(self.used[g])}]" for g in gids)
+
+        options = subset.Options()
+        options.retain_gids = True
+        options.notdef_outline = True
+        options.drop_tables += ["FFTM"]
+        subsetter = subset.Subsetter(options)
+        subsetter.populate(gids=[0] + gids)
+        font = TTFont(self.path, fontNumber=0)
+        subsetter.subset(font)
+        buf = io.BytesIO()
+        font.save(buf)
+        font_file = buf.getvalue()
+        packed = zlib.compress(font_file)
+
+        bfchars = [f"<{g:04X}> <{self.used[g].encode('utf-16-be').hex().upper()}>" for g in gids]
+        blocks = "".join(f"{len(b)} beginbfchar\n" + "\n".join(b) + "\nendbfchar\n"
+                         for b in (bfchars[i:i + 100] for i in range(0, len(bfchars), 100)))
+        to_unicode = ("/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n"
+                      "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def\n"
+                      "/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n"
+                      "1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n" + blocks +
+                      "endcmap\nCMapName currentdict /CMap defineresource pop\nend\nend").encode()
+        return [
+            (type0_id, f"<< /Type /Font /Subtype /Type0 /BaseFont /{name} /Encoding /Identity-H "
+                       f"/DescendantFonts [{cid_id} 0 R] /ToUnicode {cmap_id} 0 R >>".encode()),
+            (cid_id, f"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /{name} "
+                     f"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+                     f"/FontDescriptor {desc_id} 0 R /CIDToGIDMap /Identity /W [{widths}] >>".encode()),
+            (desc_id, f"<< /Type /FontDescriptor /FontName /{name} /Flags 32 "
+                      f"/FontBBox [{sc(head.xMin)} {sc(head.yMin)} {sc(head.xMax)} {sc(head.yMax)}] "
+                      f"/ItalicAngle 0 /Ascent {sc(hhea.ascent)} /Descent {sc(hhea.descent)} "
+                      f"/CapHeight {sc(getattr(os2, 'sCapHeight', hhea.ascent))} /StemV 80 "
+                      f"/FontFile2 {file_id} 0 R >>".encode()),
+            (file_id, b"<< /Length %d /Length1 %d /Filter /FlateDecode >>\nstream\n" % (len(packed), len(font_file))
+                      + packed + b"\nendstream"),
+            (cmap_id, b"<< /Length %d >>\nstream\n" % len(to_unicode) + to_unicode + b"\nendstream"),
+        ]
+
+class StreamingPdf:
+    # minimal PDF writer: each page is emitted as soon as it is finished and only the
+    # object offsets are kept until the xref table is written at the end
+    def __init__(self, width, height, unicode_font=None):
+        self.width, self.height = width, height
+        self.unicode_font = unicode_font
+        self.offsets = {}
+        self.pos = 0
+        self.page_ids = []
+        # 1 catalog, 2 pages, 3/4 Courier, 5 the Unicode font if any (written by close())
+        self.next_id = 6 if unicode_font else 5
+        self.ops = []
+
+    def _obj(self, num, body):
+        self.offsets[num] = self.pos
+        data = b"%d 0 obj\n" % num + body + b"\nendobj\n"
+        self.pos += len(data)
+        return data
+
+    def start(self):
+        header = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+        self.pos = len(header)
+        return (header
+                + self._obj(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>")
+                + self._obj(4, b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier-Bold /Encoding /WinAnsiEncoding >>"))
+
+    def can_render(self, value, unicode=False):
+        if unicode and self.unicode_font:
+            return self.unicode_font.covers(value)
+        try:
+            value.encode("cp1252")
+            return True
+        except UnicodeEncodeError:
+            return False
+
+    def text(self, x, y, value, size, bold=False, unicode=False):
+        if unicode and self.unicode_font:
+            self.ops.append(f"BT /F3 {size} Tf {x:.1f} {y:.1f} Td {self.unicode_font.encode(value)} Tj ET")
+            return
+        value = value.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        self.ops.append(f"BT /F{2 if bold else 1} {size} Tf {x:.1f} {y:.1f} Td ({value}) Tj ET")
+
+    def text_width(self, value, size, unicode=False):
+        if unicode and self.unicode_font:
+            return self.unicode_font.width(value, size)
+        return len(value) * size * 0.6
+
+    def end_page(self):
+        content = "\n".join(self.ops).encode("cp1252")
+        self.ops = []
+        content_id, page_id = self.next_id, self.next_id + 1
+        self.next_id += 2
+        self.page_ids.append(page_id)
+        fonts = b"/F1 3 0 R /F2 4 0 R" + (b" /F3 5 0 R" if self.unicode_font else b"")
+        return (self._obj(content_id, b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+                + self._obj(page_id, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+                            b"/Resources << /Font << %s >> >> /Contents %d 0 R >>"
+                            % (self.width, self.height, fonts, content_id)))
+
+    def close(self):
+        data = b""
+        if self.unicode_font:
+            for num, body in self.unicode_font.objects(5, self.next_id):
+                data += self._obj(num, body)
+            self.next_id += 4
+        kids = b" ".join(b"%d 0 R" % i for i in self.page_ids)
+        data += (self._obj(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.page_ids)))
+                 + self._obj(1, b"<< /Type /Catalog /Pages 2 0 R >>"))
+        xref_pos = self.pos
+        data += b"xref\n0 %d\n0000000000 65535 f \n" % self.next_id
+        data += b"".join(b"%010d 00000 n \n" % self.offsets[i] for i in range(1, self.next_id))
+        data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (self.next_id, xref_pos)
+        return data
+
+# landscape letter, 6pt Courier (3.6pt per character); widths are in characters and sized so
+# issue ids (uuid4) and tx hashes (sha256 hex) are always printed in full
+PDF_COLUMNS = [("issue_id", 36), ("title", 22), ("reporter", 12), ("severity", 8), ("status", 9),
+               ("tx_hash", 64), ("block", 5), ("lang", 4), ("report_summary", 29), ("timestamp", 10)]
+PDF_UNTRIMMED = {"issue_id", "tx_hash"}
+# user-supplied text, drawn with the embedded Unicode font when one is available
+PDF_FREE_TEXT = {"title", "reporter", "report_summary"}
+
+def _fit(pdf, value, width, size, unicode):
+    ellipsis = "\u2026" if pdf.can_render("\u2026", unicode) else "..."
+    if pdf.text_width(value, size, unicode) <= width:
+        return value
+    while value and pdf.text_width(value + ellipsis, size, unicode) > width:
+        value = value[:-1]
+    return value + ellipsis
+
+def stream_pdf():
+    pdf = StreamingPdf(792, 612, PdfUnicodeFont(EXPORT_PDF_FONT) if EXPORT_PDF_FONT else None)
+    size, char_w, line_h, margin = 6, 3.6, 8, 20
+    page = 0
+    y = 0
+    def draw_row(values, bold=False):
+        x = margin
+        for (name, chars), val in zip(PDF_COLUMNS, values):
+            val = str(val).replace("\r", " ").replace("\n", " ")
+            unicode = not bold and name in PDF_FREE_TEXT
+            if not pdf.can_render(val, unicode):
+                val, unicode = PDF_UNRENDERABLE, False
+            if name not in PDF_UNTRIMMED:
+                val = _fit(pdf, val, chars * char_w, size, unicode)
+            pdf.text(x, y, val, size, bold, unicode)
+            x += (chars + 1) * char_w
+    def new_page():
+        nonlocal page, y
+        page += 1
+        pdf.text(margin, pdf.height - 30, f"Campus Issue Audit Report - page {page}", 10, bold=True)
+        y = pdf.height - 48
+        draw_row([name for name, _ in PDF_COLUMNS], bold=True)
+        y -= line_h
+    yield pdf.start()
+    new_page()
+    for rows in iter_export_rows():
+        for row in rows:
+            if y < margin + line_h:
+                yield pdf.end_page()
+                new_page()
+            draw_row(row)
+            y -= line_h
+    yield pdf.end_page()
+    yield pdf.close()
+
+@app.get("/api/export")
+def export_audit(fmt: Literal["csv", "pdf"] = Query("csv", alias="format")):
+    # sync generators are iterated in the threadpool, so the event loop stays free
+    stamp = time.strftime("%Y%m%d")
+    if fmt == "csv":
+        return StreamingResponse(stream_csv(), media_type="text/csv",
+                                 headers={"Content-Disposition": f'attachment; filename="audit_{stamp}.csv"'})
+    return StreamingResponse(stream_pdf(), media_type="application/pdf",
+                             headers={"Content-Disposition": f'attachment; filename="audit_{stamp}.pdf"'})
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,153 @@
+import csv, io, json, sys, types
+from unittest import mock
+
+import pytest
+from fastapi.testclient import TestClient
+
+# main.py loads the HuggingFace models at import time; the export does not use them
+_transformers = sys.modules.get("transformers")
+sys.modules["transformers"] = types.SimpleNamespace(pipeline=mock.Mock())
+try:
+    import main
+finally:
+    if _transformers is None:
+        del sys.modules["transformers"]
+    else:
+        sys.modules["transformers"] = _transformers
+
+client = TestClient(main.app)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+
+    def write(issues, reports):
+        with open("data/issues.json", "w") as f:
+            json.dump(issues, f)
+        with open("data/reports.json", "w") as f:
+            json.dump(reports, f)
+    return write
+
+
+def make_issue(issue_id, title="Broken fan"):
+    tx_hash = main.add_block(issue_id)
+    return {"id": issue_id, "title": title, "description": "d", "reporter": "student",
+            "severity": "high", "status": "pending", "txHash": tx_hash}
+
+
+def make_report(issue_id, summary):
+    return {"issue_id": issue_id, "text": summary, "lang": "en", "summary": summary, "timestamp": 1700000000}
+
+
+def read_csv(response):
+    return list(csv.reader(io.StringIO(response.text)))
+
+
+def test_rows_join_reports_and_blocks(store):
+    a, b = make_issue("issue-a"), make_issue("issue-b")
+    store([a, b], [make_report("issue-a", "first"), make_report("issue-b-typo", "orphan"),
+                   make_report("issue-a", "second")])
+    rows = [row for chunk in main.iter_export_rows() for row in chunk]
+    index = {blk["hash"]: blk["index"] for blk in main.CHAIN}
+    assert rows == [
+        ["issue-a", "Broken fan", "student", "high", "pending", a["txHash"], index[a["txHash"]],
+         "en", "first", 1700000000],
+        ["issue-a", "Broken fan", "student", "high", "pending", a["txHash"], index[a["txHash"]],
+         "en", "second", 1700000000],
+        ["issue-b", "Broken fan", "student", "high", "pending", b["txHash"], index[b["txHash"]], "", "", ""],
+    ]
+
+
+def test_empty_store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert list(main.iter_export_rows()) == []
+    assert read_csv(client.get("/api/export")) == [main.EXPORT_COLUMNS]
+
+
+def test_corrupt_store_is_not_an_empty_export(store):
+    store([], [])
+    with open("data/issues.json", "w") as f:
+        f.write('[{"id": "issue-a", ')
+    with pytest.raises(main.ijson.JSONError):
+        list(main.iter_export_rows())
+
+
+def test_chunks_split_at_chunk_rows(store):
+    issues = [{"id": f"issue-{n}", "txHash": ""} for n in range(main.EXPORT_CHUNK_ROWS + 1)]
+    store(issues, [make_report("issue-0", "first"), make_report("issue-0", "second")])
+    sizes = [len(chunk) for chunk in main.iter_export_rows()]
+    assert sizes == [main.EXPORT_CHUNK_ROWS, 2]
+
+
+def test_store_rewritten_mid_export(store):
+    issues = [{"id": f"issue-{n}", "txHash": ""} for n in range(main.EXPORT_CHUNK_ROWS * 2)]
+    store(issues, [make_report(f"issue-{n}", "old") for n in range(0, len(issues), 100)])
+    chunks = main.iter_export_rows()
+    rows = list(next(chunks))
+    # an issue is accepted and the store shrinks and gains reports while the export is running
+    assert client.post("/api/issues/issue-0/accept").json() == {"ok": True}
+    main.save_json("data/issues.json", issues[:3])
+    main.save_json("data/reports.json", [make_report(i["id"], "new") for i in issues])
+    rows += [row for chunk in chunks for row in chunk]
+    assert [r[0] for r in rows] == [i["id"] for i in issues]
+    assert {r[8] for r in rows} == {"old", ""}
+
+
+def test_csv_export(store):
+    a = make_issue("issue-a", title='=HYPERLINK("x")')
+    store([a, make_issue("issue-b")], [make_report("issue-a", "@cmd"), make_report("issue-a", "fine")])
+    response = client.get("/api/export", params={"format": "csv"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = read_csv(response)
+    assert rows[0] == main.EXPORT_COLUMNS
+    assert [r[0] for r in rows[1:]] == ["issue-a", "issue-a", "issue-b"]
+    assert rows[1][1] == "'=HYPERLINK(\"x\")"
+    assert rows[1][5] == a["txHash"]
+    assert [r[8] for r in rows[1:]] == ["'@cmd", "fine", ""]
+
+
+def test_pdf_export_keeps_full_ids_and_hashes(store, monkeypatch):
+    monkeypatch.setattr(main, "EXPORT_PDF_FONT", None)
+    issue_id = "3d6b3389-afe4-4c4e-9d0a-2f0c1f4c8b11"
+    issues = [make_issue(issue_id, title="A very long title " * 10)]
+    issues += [make_issue(f"issue-{n}") for n in range(150)]
+    store(issues, [make_report(issue_id, "summary " * 40)])
+    response = client.get("/api/export", params={"format": "pdf"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.content.startswith(b"%PDF")
+    assert response.content.rstrip().endswith(b"%%EOF")
+    assert b"/Count 3" in response.content
+    assert issue_id.encode() in response.content
+    assert all(i["txHash"].encode() in response.content for i in issues)
+    assert b"A very long title " * 10 not in response.content
+
+
+@pytest.mark.skipif(main.EXPORT_PDF_FONT is None, reason="no Unicode TrueType font found")
+def test_pdf_export_embeds_unicode_font(store):
+    issues = [make_issue("issue-a"), make_issue("issue-b")]
+    store(issues, [make_report("issue-a", "Вентилятор не работает"), make_report("issue-b", "漢字")])
+    response = client.get("/api/export", params={"format": "pdf"})
+    assert response.status_code == 200
+    content = response.content
+    assert b"/Subtype /Type0" in content and b"/Encoding /Identity-H" in content
+    assert b"/FontFile2" in content and b"/ToUnicode" in content
+    # ToUnicode maps the summary's glyphs back to their code points
+    assert all(f"<{ord(c):04X}>".encode() in content for c in "Вентилятор")
+    assert b"(" + main.PDF_UNRENDERABLE.encode() + b")" in content
+
+
+def test_pdf_export_without_unicode_font_marks_cells(store, monkeypatch):
+    monkeypatch.setattr(main, "EXPORT_PDF_FONT", None)
+    store([make_issue("issue-a")], [make_report("issue-a", "Вентилятор не работает")])
+    content = client.get("/api/export", params={"format": "pdf"}).content
+    assert b"/Type0" not in content
+    assert b"(" + main.PDF_UNRENDERABLE.encode() + b")" in content
+
+
+def test_invalid_format(store):
+    store([], [])
+    assert client.get("/api/export", params={"format": "xlsx"}).status_code == 422